@@ -1,3 +1,3 @@
 from .agent import ActionParseError, WebNavAgent
-from .browser import Browser
-from .llm import call_llm
+from .browser import Browser, BrowserPool
+from .llm import call_llm, call_llm_stream
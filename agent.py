@@ -1,9 +1,16 @@
 import re
 from dataclasses import dataclass, field
+from collections.abc import Iterator
 from typing import Any, Callable
 
+import pybase64 as base64
+
 from .browser import Browser, BrowserState
-from .llm import call_llm
+from .llm import call_llm_stream
+
+_ACTION_RE = re.compile(r"Action:\s*(\w+)\(([^)]*)\)")
+_ACTION_NAME_RE = re.compile(r"Action:\s*(\w+)")
+_IMAGE_URL_PREFIX = "data:image/jpeg;base64,"
 
 
 SYSTEM_PROMPT = """You are a web navigation agent. You control a browser to accomplish user tasks.
@@ -58,14 +65,14 @@ I need login credentials. I'll ask the user.
 Action: CallUser(What are the login credentials?)"""
 
 
-@dataclass
+@dataclass(slots=True)
 class Action:
     name: str
     args: dict[str, Any] = field(default_factory=dict)
     error: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Step:
     state: BrowserState
     response: str
@@ -77,52 +84,122 @@ class ActionParseError(Exception):
 
 
 def build_message(state: BrowserState, task: str | None = None) -> dict:
-    content = []
+    image_b64 = base64.b64encode(state.screenshot).decode("ascii")
+    url_part = {"type": "text", "text": f"Current URL: {state.url}"}
+    image_part = {
+        "type": "image_url",
+        "image_url": {"url": _IMAGE_URL_PREFIX + image_b64},
+    }
     if task:
-        content.append({"type": "text", "text": f"Task: {task}"})
-    content.append({"type": "text", "text": f"Current URL: {state.url}"})
-    content.append(
-        {
-            "type": "image_url",
-            "image_url": {"url": f"data:image/png;base64,{state.screenshot_b64}"},
-        }
-    )
+        content = [{"type": "text", "text": f"Task: {task}"}, url_part, image_part]
+    else:
+        content = [url_part, image_part]
     return {"role": "user", "content": content}
 
 
 def trim_images(conversation: list[dict], max_images: int) -> list[dict]:
-    """Keep only the last N images in conversation."""
-    image_indices = []
-    for i, msg in enumerate(conversation):
-        if msg["role"] == "user" and isinstance(msg.get("content"), list):
-            for item in msg["content"]:
-                if item.get("type") == "image_url":
-                    image_indices.append(i)
-                    break
-
-    if len(image_indices) <= max_images:
-        return conversation
-
-    indices_to_remove = set(image_indices[:-max_images])
-    result = []
-    for i, msg in enumerate(conversation):
-        if i in indices_to_remove:
-            if msg["role"] == "user" and isinstance(msg.get("content"), list):
-                new_content = [
-                    item for item in msg["content"] if item.get("type") != "image_url"
-                ]
-                if new_content:
-                    result.append({"role": "user", "content": new_content})
+    """Keep only the last N images in conversation, plus the task message's.
+
+    The first user message, which carries the task, is never trimmed and the
+    input is never mutated, so the start of the conversation is sent
+    byte-identical every turn and the provider can reuse its cached prefix.
+    """
+    task_idx = next(
+        (i for i, msg in enumerate(conversation) if msg["role"] == "user"), None
+    )
+    result = None
+    kept = 0
+    for i in reversed(range(len(conversation))):
+        msg = conversation[i]
+        content = msg.get("content")
+        if i == task_idx or msg["role"] != "user" or not isinstance(content, list):
+            continue
+        if not any(item.get("type") == "image_url" for item in content):
+            continue
+        if kept < max_images:
+            kept += 1
+            continue
+
+        if result is None:
+            result = list(conversation)
+        new_content = [item for item in content if item.get("type") != "image_url"]
+        if new_content:
+            result[i] = {"role": "user", "content": new_content}
         else:
-            result.append(msg)
-    return result
+            del result[i]
+    return conversation if result is None else result
+
+
+def _parse_click(args_str: str) -> Action:
+    if not args_str:
+        raise ActionParseError("Click requires coordinates: Click(x, y)")
+    try:
+        x_str, y_str = args_str.split(",")
+    except ValueError:
+        raise ActionParseError(
+            f"Click requires exactly 2 arguments (x, y), got {args_str.count(',') + 1}"
+        )
+    x, y = int(x_str), int(y_str)
+    if not (0 <= x <= 1000 and 0 <= y <= 1000):
+        raise ActionParseError(f"Coordinates must be 0-1000, got ({x}, {y})")
+    return Action(name="Click", args={"x": x, "y": y})
+
+
+def _parse_scroll(args_str: str) -> Action:
+    if not args_str:
+        raise ActionParseError("Scroll requires arguments: Scroll(x, y, direction)")
+    try:
+        x_str, y_str, direction = args_str.split(",")
+    except ValueError:
+        raise ActionParseError(
+            "Scroll requires 3 arguments (x, y, direction), "
+            f"got {args_str.count(',') + 1}"
+        )
+    x, y = int(x_str), int(y_str)
+    direction = direction.strip().strip("'\"").lower()
+    if direction not in ("up", "down"):
+        raise ActionParseError(
+            f"Scroll direction must be 'up' or 'down', got '{direction}'"
+        )
+    return Action(name="Scroll", args={"x": x, "y": y, "direction": direction})
+
+
+def _parse_type(args_str: str) -> Action:
+    if not args_str:
+        raise ActionParseError("Type requires content: Type(text to type)")
+    return Action(name="Type", args={"content": args_str})
+
+
+def _parse_press(args_str: str) -> Action:
+    if not args_str:
+        raise ActionParseError("Press requires a key: Press(Enter)")
+    return Action(name="Press", args={"key": args_str})
+
+
+def _parse_call_user(args_str: str) -> Action:
+    if not args_str:
+        raise ActionParseError(
+            "CallUser requires a question: CallUser(your question here)"
+        )
+    return Action(name="CallUser", args={"question": args_str})
+
+
+_PARSERS: dict[str, Callable[[str], Action]] = {
+    "Click": _parse_click,
+    "Scroll": _parse_scroll,
+    "Type": _parse_type,
+    "Press": _parse_press,
+    "CallUser": _parse_call_user,
+    "Wait": lambda _: Action(name="Wait"),
+    "Finished": lambda _: Action(name="Finished"),
+}
 
 
 def parse_action(response: str) -> Action:
     """Parse action from the LLM response."""
-    action_match = re.search(r"Action:\s*(\w+)\(([^)]*)\)", response)
+    action_match = _ACTION_RE.search(response)
     if not action_match:
-        action_line = re.search(r"Action:\s*(\w+)", response)
+        action_line = _ACTION_NAME_RE.search(response)
         if action_line:
             name = action_line.group(1)
             if name in ("Wait", "Finished"):
@@ -137,65 +214,28 @@ def parse_action(response: str) -> Action:
     name = action_match.group(1)
     args_str = action_match.group(2).strip()
 
+    parser = _PARSERS.get(name)
+    if parser is None:
+        raise ActionParseError(f"Unknown action: {name}")
     try:
-        if name == "Click":
-            if not args_str:
-                raise ActionParseError("Click requires coordinates: Click(x, y)")
-            parts = [p.strip() for p in args_str.split(",")]
-            if len(parts) != 2:
-                raise ActionParseError(
-                    f"Click requires exactly 2 arguments (x, y), got {len(parts)}"
-                )
-            x, y = int(parts[0]), int(parts[1])
-            if not (0 <= x <= 1000 and 0 <= y <= 1000):
-                raise ActionParseError(f"Coordinates must be 0-1000, got ({x}, {y})")
-            return Action(name="Click", args={"x": x, "y": y})
-
-        elif name == "Scroll":
-            if not args_str:
-                raise ActionParseError(
-                    "Scroll requires arguments: Scroll(x, y, direction)"
-                )
-            parts = [p.strip() for p in args_str.split(",")]
-            if len(parts) != 3:
-                raise ActionParseError(
-                    f"Scroll requires 3 arguments (x, y, direction), got {len(parts)}"
-                )
-            x, y = int(parts[0]), int(parts[1])
-            direction = parts[2].strip("'\"").lower()
-            if direction not in ("up", "down"):
-                raise ActionParseError(
-                    f"Scroll direction must be 'up' or 'down', got '{direction}'"
-                )
-            return Action(name="Scroll", args={"x": x, "y": y, "direction": direction})
-
-        elif name == "Type":
-            if not args_str:
-                raise ActionParseError("Type requires content: Type(text to type)")
-            return Action(name="Type", args={"content": args_str})
-
-        elif name == "Press":
-            if not args_str:
-                raise ActionParseError("Press requires a key: Press(Enter)")
-            return Action(name="Press", args={"key": args_str})
-
-        elif name == "CallUser":
-            if not args_str:
-                raise ActionParseError(
-                    "CallUser requires a question: CallUser(your question here)"
-                )
-            return Action(name="CallUser", args={"question": args_str})
-
-        elif name in ("Wait", "Finished"):
-            return Action(name=name)
-
-        else:
-            raise ActionParseError(f"Unknown action: {name}")
-
+        return parser(args_str)
     except ValueError as e:
         raise ActionParseError(f"Invalid argument format: {e}")
 
 
+def collect_response(chunks: Iterator[str]) -> str:
+    """Read a streamed response up to its action, then close the stream."""
+    response = ""
+    for chunk in chunks:
+        response += chunk
+        if ")" in chunk and _ACTION_RE.search(response):
+            break
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
+    return response
+
+
 def execute_action(action: Action, browser: Browser) -> str | None:
     try:
         if action.name == "Click":
@@ -216,7 +256,7 @@ def execute_action(action: Action, browser: Browser) -> str | None:
 class WebNavAgent:
     def __init__(
         self,
-        llm_fn: Callable[[list[dict]], str] = call_llm,
+        llm_fn: Callable[[list[dict]], str | Iterator[str]] = call_llm_stream,
         max_images: int = 1,
         max_steps: int = 10,
         headless: bool = True,
@@ -241,6 +281,8 @@ class WebNavAgent:
             for _ in range(self.max_steps):
                 trimmed_conv = trim_images(conversation, self.max_images)
                 response = self.llm_fn(trimmed_conv)
+                if not isinstance(response, str):
+                    response = collect_response(response)
                 conversation.append({"role": "assistant", "content": response})
 
                 try:
@@ -283,7 +325,7 @@ class WebNavAgent:
                     )
                     continue
 
-                browser.wait(3000)  # Waits 3 seconds
+                browser.wait_until_idle(5000)
                 state = browser.get_state()
                 conversation.append(build_message(state))
 
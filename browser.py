@@ -1,26 +1,72 @@
-import base64
+import atexit
+import io
+import time
 from dataclasses import dataclass
 
-from playwright.sync_api import Browser as PlaywrightBrowser, Page, sync_playwright
+from playwright.sync_api import (
+    Browser as PlaywrightBrowser,
+    Page,
+    TimeoutError as PlaywrightTimeoutError,
+    sync_playwright,
+)
+from PIL import Image
 
 
-@dataclass
+@dataclass(slots=True)
 class BrowserState:
-    screenshot_b64: str
+    screenshot: bytes
     url: str
 
 
+class BrowserPool:
+    """Process-wide Chromium instances shared by every Browser.
+
+    Launching Chromium costs a second or two, so one instance per headless
+    mode is started on first use and each Browser only opens its own page
+    (with its own context) on it. Everything is shut down at interpreter
+    exit.
+    """
+
+    _playwright = None
+    _browsers: dict[bool, PlaywrightBrowser] = {}
+    _atexit_registered = False
+
+    @classmethod
+    def browser(cls, headless: bool = True) -> PlaywrightBrowser:
+        if headless not in cls._browsers:
+            if cls._playwright is None:
+                cls._playwright = sync_playwright().start()
+            if not cls._atexit_registered:
+                atexit.register(cls.shutdown)
+                cls._atexit_registered = True
+            cls._browsers[headless] = cls._playwright.chromium.launch(
+                headless=headless
+            )
+        return cls._browsers[headless]
+
+    @classmethod
+    def shutdown(cls) -> None:
+        for browser in cls._browsers.values():
+            browser.close()
+        cls._browsers.clear()
+        if cls._playwright:
+            cls._playwright.stop()
+        cls._playwright = None
+
+
 class Browser:
     def __init__(
         self,
         headless: bool = True,
         viewport_width: int = 1280,
         viewport_height: int = 720,
+        screenshot_quality: int = 75,
+        screenshot_scale: float = 0.7,
     ):
         self.viewport_width = viewport_width
         self.viewport_height = viewport_height
-        self._playwright = None
-        self._browser: PlaywrightBrowser | None = None
+        self.screenshot_quality = screenshot_quality
+        self.screenshot_scale = screenshot_scale
         self._page: Page | None = None
         self._headless = headless
 
@@ -31,20 +77,30 @@ class Browser:
         return self._page
 
     def start(self, start_url: str = "https://www.google.com") -> BrowserState:
-        self._playwright = sync_playwright().start()
-        self._browser = self._playwright.chromium.launch(headless=self._headless)
-        self._page = self._browser.new_page(
+        self._page = BrowserPool.browser(self._headless).new_page(
             viewport={"width": self.viewport_width, "height": self.viewport_height}
         )
         self._page.goto(start_url)
         return self.get_state()
 
     def get_state(self) -> BrowserState:
-        screenshot_bytes = self.page.screenshot()
-        return BrowserState(
-            screenshot_b64=base64.b64encode(screenshot_bytes).decode("utf-8"),
-            url=self.page.url,
+        return BrowserState(screenshot=self._screenshot(), url=self.page.url)
+
+    def _screenshot(self) -> bytes:
+        if self.screenshot_scale == 1:
+            return self.page.screenshot(type="jpeg", quality=self.screenshot_quality)
+
+        # Capture losslessly so the image is only JPEG-compressed once, after resizing
+        img = Image.open(io.BytesIO(self.page.screenshot(type="png")))
+        size = (
+            round(img.width * self.screenshot_scale),
+            round(img.height * self.screenshot_scale),
+        )
+        buf = io.BytesIO()
+        img.convert("RGB").resize(size, Image.Resampling.LANCZOS).save(
+            buf, format="JPEG", quality=self.screenshot_quality
         )
+        return buf.getvalue()
 
     def click(self, x: int, y: int) -> None:
         px_x = int(x * self.viewport_width / 1000)
@@ -67,13 +123,41 @@ class Browser:
     def wait(self, ms: int = 1000) -> None:
         self.page.wait_for_timeout(ms)
 
+    def wait_until_idle(self, timeout_ms: int = 5000, settle_ms: int = 1000) -> None:
+        """Wait for the page to settle after an action, within timeout_ms.
+
+        Mouse and keyboard input does not wait for the navigation it triggers,
+        and wait_for_load_state returns at once on a page that is already
+        loaded. So this first waits up to settle_ms for the main frame to
+        navigate, and then for the (possibly new) document to load and go
+        network idle. Playwright timeouts are swallowed.
+
+        Trade-offs: navigation that takes longer than settle_ms to commit is
+        missed, and the old page is captured. An in-page update with no
+        navigation (e.g. add to cart) only gets settle_ms, since networkidle
+        has already fired for that document.
+        """
+        deadline = time.monotonic() + timeout_ms / 1000
+        try:
+            self.page.wait_for_event(
+                "framenavigated",
+                predicate=lambda frame: frame == self.page.main_frame,
+                timeout=min(settle_ms, timeout_ms),
+            )
+        except PlaywrightTimeoutError:
+            pass
+        try:
+            for state in ("load", "networkidle"):
+                # A Playwright timeout of 0 means no timeout, so never pass it
+                remaining_ms = max(1, (deadline - time.monotonic()) * 1000)
+                self.page.wait_for_load_state(state, timeout=remaining_ms)
+        except PlaywrightTimeoutError:
+            pass
+
     def close(self) -> None:
         if self._page:
             self._page.close()
-        if self._browser:
-            self._browser.close()
-        if self._playwright:
-            self._playwright.stop()
+            self._page = None
 
     def __enter__(self) -> "Browser":
         return self
@@ -6,6 +6,7 @@ python -m tiny_web_nav_agent.interactive
 
 import base64
 import io
+from collections import OrderedDict
 
 import matplotlib.pyplot as plt
 from matplotlib.backend_bases import MouseEvent
@@ -13,10 +14,28 @@ from PIL import Image
 
 from .agent import WebNavAgent
 
+_IMAGE_CACHE_SIZE = 8
+_image_cache: OrderedDict[str, Image.Image] = OrderedDict()
 
-def show_screenshot(b64_image: str) -> None:
-    img_bytes = base64.b64decode(b64_image)
-    img = Image.open(io.BytesIO(img_bytes))
+
+def _decode_image(image_url: str) -> Image.Image:
+    # Keyed by the data URL itself: it is the same str object across turns,
+    # so its hash is cached and lookups hit the identity fast path.
+    img = _image_cache.get(image_url)
+    if img is not None:
+        _image_cache.move_to_end(image_url)
+        return img
+    b64_image = image_url.split(",", 1)[1]
+    img = Image.open(io.BytesIO(base64.b64decode(b64_image)))
+    img.load()
+    _image_cache[image_url] = img
+    if len(_image_cache) > _IMAGE_CACHE_SIZE:
+        _image_cache.popitem(last=False)
+    return img
+
+
+def show_screenshot(image_url: str) -> None:
+    img = _decode_image(image_url)
     w, h = img.size
 
     fig, ax = plt.subplots()
@@ -39,8 +58,7 @@ def mock_llm(conversation: list[dict]) -> str:
         if msg["role"] == "user" and isinstance(msg.get("content"), list):
             for item in msg["content"]:
                 if item.get("type") == "image_url":
-                    b64 = item["image_url"]["url"].split(",", 1)[1]
-                    show_screenshot(b64)
+                    show_screenshot(item["image_url"]["url"])
                     break
             break
 
@@ -1,16 +1,132 @@
+import hashlib
+import json
 import os
+from collections.abc import Iterator
 
 from openai import OpenAI
 
+MODEL = "qwen/qwen3-vl-235b-a22b-instruct"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tiny_web_nav_agent")
+
 client = OpenAI(
     api_key=os.environ.get("OPENROUTER_API_KEY"),
     base_url="https://openrouter.ai/api/v1",
 )
 
 
+def _has_image(msg: dict) -> bool:
+    content = msg.get("content")
+    return isinstance(content, list) and any(
+        item.get("type") == "image_url" for item in content
+    )
+
+
+def add_cache_breakpoint(conversation: list[dict], model: str = MODEL) -> list[dict]:
+    """Mark the newest stable message as cacheable for Anthropic-routed models.
+
+    Anthropic only caches up to an explicit cache_control breakpoint. The
+    breakpoint goes on the last message that next turn's conversation will
+    still start with: the one just before the oldest screenshot that
+    trim_images may strip next, or the last message if there is none. The
+    task message's screenshot is never stripped, so it does not count.
+    Other providers cache stable prefixes automatically, so the
+    conversation is returned unchanged for them.
+    """
+    if not model.startswith("anthropic/") or not conversation:
+        return conversation
+
+    user_idx = [i for i, msg in enumerate(conversation) if msg["role"] == "user"]
+    trimmable = [i for i in user_idx[1:] if _has_image(conversation[i])]
+    stable_idx = trimmable[0] - 1 if trimmable else len(conversation) - 1
+
+    msg = conversation[stable_idx]
+    content = msg["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    marked = {**content[-1], "cache_control": {"type": "ephemeral"}}
+    result = list(conversation)
+    result[stable_idx] = {**msg, "content": [*content[:-1], marked]}
+    return result
+
+
+def _cache_path(conversation: list[dict]) -> str | None:
+    if os.environ.get("TWNA_CACHE") != "1":
+        return None
+    payload = json.dumps([MODEL, conversation], sort_keys=True, default=str)
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.txt")
+
+
+def _read_cache(cache_path: str | None) -> str | None:
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
+    with open(cache_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_cache(cache_path: str | None, content: str | None) -> None:
+    if cache_path is None or content is None:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, cache_path)
+
+
 def call_llm(conversation: list[dict]) -> str:
+    """Call the model. With TWNA_CACHE=1, responses are memoized on disk
+    by conversation, which makes reruns and replays deterministic."""
+    cache_path = _cache_path(conversation)
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        return cached
+
     response = client.chat.completions.create(
-        model="qwen/qwen3-vl-235b-a22b-instruct",
-        messages=conversation,
+        model=MODEL,
+        messages=add_cache_breakpoint(conversation),
     )
-    return response.choices[0].message.content
+    content = response.choices[0].message.content
+    _write_cache(cache_path, content)
+    return content
+
+
+def call_llm_stream(conversation: list[dict]) -> Iterator[str]:
+    """Yield the response as it is generated.
+
+    Closing the generator early closes the connection, which cancels the
+    rest of the generation. With TWNA_CACHE=1, the response is cached when
+    the stream runs to the end, or when it is closed after a complete
+    action. Any other early close (a consumer error, a generator collected
+    mid-stream) is not cached, since call_llm would replay the truncated
+    text.
+    """
+    # Imported here because agent imports this module
+    from .agent import _ACTION_RE
+
+    cache_path = _cache_path(conversation)
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        yield cached
+        return
+
+    parts: list[str] = []
+    response = None
+    try:
+        with client.chat.completions.create(
+            model=MODEL,
+            messages=add_cache_breakpoint(conversation),
+            stream=True,
+        ) as stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        response = "".join(parts)
+    except GeneratorExit:
+        text = "".join(parts)
+        if _ACTION_RE.search(text):
+            response = text
+        raise
+    finally:
+        _write_cache(cache_path, response)
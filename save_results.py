@@ -1,11 +1,24 @@
-import base64
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from .agent import Step
 
+_REASONING_RE = re.compile(r"<reasoning>(.*?)</reasoning>", re.DOTALL)
+_MAX_WRITE_WORKERS = 8
+
+
+def _write_screenshot(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
 
 def save_run(
     task: str,
@@ -16,8 +29,8 @@ def save_run(
         <output_dir>/<timestamp>/
             summary.json (task, steps, actions, reasoning)
             screenshots/
-                step_00.png
-                step_01.png
+                step_00.jpg
+                step_01.jpg
                 ...
 
     Return the path to the created run directory.
@@ -29,19 +42,20 @@ def save_run(
     screenshots_dir = os.path.join(run_dir, "screenshots")
     os.makedirs(screenshots_dir, exist_ok=True)
 
+    if steps:
+        img_paths = [
+            os.path.join(screenshots_dir, f"step_{i:02d}.jpg")
+            for i in range(len(steps))
+        ]
+        screenshots = [step.state.screenshot for step in steps]
+        with ThreadPoolExecutor(
+            max_workers=min(_MAX_WRITE_WORKERS, len(steps))
+        ) as executor:
+            list(executor.map(_write_screenshot, img_paths, screenshots))
+
     step_records = []
     for i, step in enumerate(steps):
-        img_path = os.path.join(
-            screenshots_dir, f"step_{i:02d}.png"
-        )
-        with open(img_path, "wb") as f:
-            f.write(base64.b64decode(step.state.screenshot_b64))
-
-        reasoning_match = re.search(
-            r"<reasoning>(.*?)</reasoning>",
-            step.response,
-            re.DOTALL,
-        )
+        reasoning_match = _REASONING_RE.search(step.response)
         reasoning = (
             reasoning_match.group(1).strip()
             if reasoning_match
@@ -52,7 +66,7 @@ def save_run(
             {
                 "step": i,
                 "url": step.state.url,
-                "screenshot": f"screenshots/step_{i:02d}.png",
+                "screenshot": f"screenshots/step_{i:02d}.jpg",
                 "llm_response": step.response,
                 "reasoning": reasoning,
                 "action": step.action.name,
@@ -69,7 +83,11 @@ def save_run(
     }
 
     summary_path = os.path.join(run_dir, "summary.json")
-    with open(summary_path, "w") as f:
-        json.dump(summary, f, indent=2)
+    if orjson is not None:
+        with open(summary_path, "wb") as f:
+            f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+    else:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
 
     return run_dir
@@ -2,18 +2,28 @@
 python -m unittest tiny_web_nav_agent.tests.test_agent
 """
 
+import base64
+import io
+import json
+import os
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import ANY, MagicMock, patch
+
+from PIL import Image
 
 from ..agent import (
     Action,
     ActionParseError,
+    Step,
     build_message,
+    collect_response,
     execute_action,
     parse_action,
     trim_images,
 )
-from ..browser import BrowserState
+from .. import browser as browser_module, llm, save_results
+from ..browser import BrowserPool, BrowserState
 
 
 class ParseActionTest(unittest.TestCase):
@@ -143,7 +153,7 @@ Action: Click(100, 200)"""
 class BuildMessageTest(unittest.TestCase):
     def test_with_task(self):
         state = BrowserState(
-            screenshot_b64="test_screenshot_1", url="https://example.com"
+            screenshot=b"test_screenshot_1", url="https://example.com"
         )
         result = build_message(state, task="Book a flight")
 
@@ -158,11 +168,17 @@ class BuildMessageTest(unittest.TestCase):
         self.assertIn("https://example.com", result["content"][1]["text"])
 
         self.assertEqual(result["content"][2]["type"], "image_url")
-        self.assertIn("test_screenshot_1", result["content"][2]["image_url"]["url"])
+        self.assertIn(
+            base64.b64encode(b"test_screenshot_1").decode(),
+            result["content"][2]["image_url"]["url"],
+        )
+        self.assertTrue(
+            result["content"][2]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+        )
 
     def test_without_task(self):
         state = BrowserState(
-            screenshot_b64="test_screenshot_2", url="https://google.com"
+            screenshot=b"test_screenshot_2", url="https://google.com"
         )
         result = build_message(state)
 
@@ -183,7 +199,7 @@ class TrimImagesTest(unittest.TestCase):
                 {"type": "text", "text": text},
                 {
                     "type": "image_url",
-                    "image_url": {"url": "data:image/png;base64,xxx"},
+                    "image_url": {"url": "data:image/jpeg;base64,xxx"},
                 },
             ],
         }
@@ -191,6 +207,16 @@ class TrimImagesTest(unittest.TestCase):
     def _make_text_message(self, role: str, text: str) -> dict:
         return {"role": role, "content": text}
 
+    def _image_texts(self, conversation: list[dict]) -> list[str]:
+        """Text of every user message that still carries an image."""
+        texts = []
+        for msg in conversation:
+            if msg["role"] == "user" and isinstance(msg.get("content"), list):
+                types = [item.get("type") for item in msg["content"]]
+                if "image_url" in types:
+                    texts.append(msg["content"][0]["text"])
+        return texts
+
     def test_no_trimming_needed(self):
         conversation = [
             self._make_text_message("system", "System prompt"),
@@ -198,58 +224,77 @@ class TrimImagesTest(unittest.TestCase):
         ]
         result = trim_images(conversation, max_images=1)
         self.assertEqual(len(result), 2)
+        self.assertIs(result, conversation)
 
     def test_trim_to_one_image(self):
         conversation = [
             self._make_text_message("system", "System prompt"),
-            self._make_image_message("URL: page1"),
+            self._make_image_message("Task: test"),
             self._make_text_message("assistant", "Click"),
             self._make_image_message("URL: page2"),
             self._make_text_message("assistant", "Type"),
             self._make_image_message("URL: page3"),
         ]
         result = trim_images(conversation, max_images=1)
-
-        image_count = 0
-        for msg in result:
-            if msg["role"] == "user" and isinstance(msg.get("content"), list):
-                for item in msg["content"]:
-                    if item.get("type") == "image_url":
-                        image_count += 1
-        self.assertEqual(image_count, 1)
+        self.assertEqual(self._image_texts(result), ["Task: test", "URL: page3"])
 
     def test_trim_to_two_images(self):
         conversation = [
             self._make_text_message("system", "System prompt"),
-            self._make_image_message("URL: page1"),
+            self._make_image_message("Task: test"),
             self._make_image_message("URL: page2"),
             self._make_image_message("URL: page3"),
+            self._make_image_message("URL: page4"),
         ]
         result = trim_images(conversation, max_images=2)
-
-        image_count = 0
-        for msg in result:
-            if msg["role"] == "user" and isinstance(msg.get("content"), list):
-                for item in msg["content"]:
-                    if item.get("type") == "image_url":
-                        image_count += 1
-        self.assertEqual(image_count, 2)
+        self.assertEqual(
+            self._image_texts(result), ["Task: test", "URL: page3", "URL: page4"]
+        )
 
     def test_keeps_text_content(self):
         conversation = [
             self._make_text_message("system", "System prompt"),
-            self._make_image_message("URL: page1"),
+            self._make_image_message("Task: test"),
             self._make_image_message("URL: page2"),
+            self._make_image_message("URL: page3"),
         ]
         result = trim_images(conversation, max_images=1)
 
-        has_page1_text = False
-        for msg in result:
-            if msg["role"] == "user" and isinstance(msg.get("content"), list):
-                for item in msg["content"]:
-                    if item.get("type") == "text" and "page1" in item.get("text", ""):
-                        has_page1_text = True
-        self.assertTrue(has_page1_text)
+        self.assertEqual(
+            result[2],
+            {"role": "user", "content": [{"type": "text", "text": "URL: page2"}]},
+        )
+
+    def test_does_not_mutate_input(self):
+        first = self._make_image_message("Task: test")
+        conversation = [
+            self._make_text_message("system", "System prompt"),
+            first,
+            self._make_image_message("URL: page2"),
+        ]
+        trim_images(conversation, max_images=1)
+        self.assertEqual(len(first["content"]), 2)
+        self.assertEqual(first["content"][1]["type"], "image_url")
+
+    def test_prefix_stable_across_turns(self):
+        conversation = [
+            self._make_text_message("system", "System prompt"),
+            self._make_image_message("Task: test"),
+        ]
+        turn_1 = trim_images(conversation, max_images=1)
+        conversation += [
+            self._make_text_message("assistant", "Click"),
+            self._make_image_message("URL: page2"),
+        ]
+        turn_2 = trim_images(conversation, max_images=1)
+        conversation += [
+            self._make_text_message("assistant", "Type"),
+            self._make_image_message("URL: page3"),
+        ]
+        turn_3 = trim_images(conversation, max_images=1)
+
+        self.assertEqual(turn_2[: len(turn_1)], turn_1)
+        self.assertEqual(turn_3[:3], turn_2[:3])
 
     def test_empty_conversation(self):
         result = trim_images([], max_images=1)
@@ -264,6 +309,31 @@ class TrimImagesTest(unittest.TestCase):
         self.assertEqual(len(result), 2)
 
 
+class CollectResponseTest(unittest.TestCase):
+    def test_stops_after_action(self):
+        closed = []
+
+        def chunks():
+            try:
+                yield "<reasoning>Search</reasoning>\nAction: Cli"
+                yield "ck(500, 4"
+                yield "00)"
+                yield "\nextra tokens"
+            finally:
+                closed.append(True)
+
+        result = collect_response(chunks())
+
+        self.assertEqual(
+            result, "<reasoning>Search</reasoning>\nAction: Click(500, 400)"
+        )
+        self.assertEqual(closed, [True])
+
+    def test_reads_to_end_without_parens(self):
+        result = collect_response(iter(["Action: ", "Finished"]))
+        self.assertEqual(result, "Action: Finished")
+
+
 class ExecuteActionTest(unittest.TestCase):
     def test_click(self):
         mock_browser = MagicMock()
@@ -322,5 +392,359 @@ class ExecuteActionTest(unittest.TestCase):
         self.assertIn("Browser error", result)
 
 
+class BrowserPoolTest(unittest.TestCase):
+    def tearDown(self):
+        BrowserPool.shutdown()
+
+    @patch.object(browser_module, "sync_playwright")
+    def test_launches_once(self, mock_sync_playwright):
+        first = BrowserPool.browser()
+        second = BrowserPool.browser()
+
+        self.assertIs(first, second)
+        mock_sync_playwright.return_value.start.assert_called_once()
+
+    @patch.object(browser_module, "sync_playwright")
+    def test_shutdown_closes_browser(self, mock_sync_playwright):
+        pw_browser = BrowserPool.browser()
+        BrowserPool.shutdown()
+
+        pw_browser.close.assert_called_once()
+        mock_sync_playwright.return_value.start.return_value.stop.assert_called_once()
+
+    @patch.object(browser_module, "sync_playwright")
+    def test_browser_close_keeps_pool(self, mock_sync_playwright):
+        browser = browser_module.Browser(screenshot_scale=1)
+        browser.start("https://example.com")
+        browser.close()
+
+        BrowserPool.browser().close.assert_not_called()
+        BrowserPool.browser().new_page.return_value.close.assert_called_once()
+
+    @patch.object(browser_module, "sync_playwright")
+    def test_headless_modes_get_separate_browsers(self, mock_sync_playwright):
+        chromium = mock_sync_playwright.return_value.start.return_value.chromium
+        chromium.launch.side_effect = lambda headless: MagicMock()
+
+        headless = BrowserPool.browser(headless=True)
+        headed = BrowserPool.browser(headless=False)
+
+        self.assertIsNot(headless, headed)
+        self.assertIs(BrowserPool.browser(headless=True), headless)
+        headless.close.assert_not_called()
+        mock_sync_playwright.return_value.start.assert_called_once()
+
+    @patch.object(browser_module, "sync_playwright")
+    @patch.object(browser_module.atexit, "register")
+    def test_registers_shutdown_at_exit(self, mock_register, _mock_sync_playwright):
+        with patch.object(BrowserPool, "_atexit_registered", False):
+            BrowserPool.browser()
+            BrowserPool.browser(headless=False)
+
+        mock_register.assert_called_once_with(BrowserPool.shutdown)
+
+
+def _make_browser(screenshot: bytes = b"", **kwargs) -> browser_module.Browser:
+    """Browser with a mocked Playwright page, so no Chromium is launched."""
+    browser = browser_module.Browser(**kwargs)
+    browser._page = MagicMock()
+    browser._page.screenshot.return_value = screenshot
+    return browser
+
+
+class ScreenshotTest(unittest.TestCase):
+    def _png(self, width: int, height: int) -> bytes:
+        buf = io.BytesIO()
+        Image.new("RGB", (width, height), "white").save(buf, format="PNG")
+        return buf.getvalue()
+
+    def test_downscales_to_jpeg(self):
+        browser = _make_browser(self._png(1280, 720), screenshot_scale=0.7)
+
+        img = Image.open(io.BytesIO(browser.get_state().screenshot))
+
+        self.assertEqual(img.format, "JPEG")
+        self.assertEqual(img.size, (896, 504))
+
+    def test_no_scale_uses_jpeg_capture(self):
+        browser = _make_browser(b"jpeg_bytes", screenshot_scale=1)
+
+        self.assertEqual(browser.get_state().screenshot, b"jpeg_bytes")
+        browser._page.screenshot.assert_called_once_with(type="jpeg", quality=75)
+
+
+class WaitUntilIdleTest(unittest.TestCase):
+    def test_waits_for_navigation_then_load_and_idle(self):
+        browser = _make_browser()
+
+        browser.wait_until_idle(5000)
+
+        calls = browser._page.method_calls
+        self.assertEqual(
+            [(name, args) for name, args, _ in calls],
+            [
+                ("wait_for_event", ("framenavigated",)),
+                ("wait_for_load_state", ("load",)),
+                ("wait_for_load_state", ("networkidle",)),
+            ],
+        )
+        self.assertEqual(calls[0].kwargs["timeout"], 1000)
+        for _, _, kwargs in calls[1:]:
+            self.assertTrue(0 < kwargs["timeout"] <= 5000)
+
+    def test_only_main_frame_navigation_counts(self):
+        browser = _make_browser()
+
+        browser.wait_until_idle(5000)
+
+        predicate = browser._page.wait_for_event.call_args.kwargs["predicate"]
+        self.assertTrue(predicate(browser._page.main_frame))
+        self.assertFalse(predicate(MagicMock()))
+
+    def test_no_navigation_still_waits_for_load_states(self):
+        browser = _make_browser()
+        browser._page.wait_for_event.side_effect = (
+            browser_module.PlaywrightTimeoutError("no navigation")
+        )
+
+        browser.wait_until_idle(5000)
+
+        self.assertEqual(browser._page.wait_for_load_state.call_count, 2)
+
+    def test_swallows_load_timeout(self):
+        browser = _make_browser()
+        browser._page.wait_for_load_state.side_effect = (
+            browser_module.PlaywrightTimeoutError("timed out")
+        )
+
+        browser.wait_until_idle(5000)
+
+        browser._page.wait_for_load_state.assert_called_once_with(
+            "load", timeout=ANY
+        )
+
+
+class AddCacheBreakpointTest(unittest.TestCase):
+    def _image_message(self, text: str) -> dict:
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": text},
+                {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,x"}},
+            ],
+        }
+
+    def _breakpoints(self, conversation: list[dict]) -> list[int]:
+        return [
+            i
+            for i, msg in enumerate(conversation)
+            if isinstance(msg["content"], list)
+            and "cache_control" in msg["content"][-1]
+        ]
+
+    def test_first_turn_marks_task_message(self):
+        conversation = [
+            {"role": "system", "content": "System prompt"},
+            self._image_message("Task: test"),
+        ]
+
+        result = llm.add_cache_breakpoint(conversation, model="anthropic/claude")
+
+        self.assertEqual(self._breakpoints(result), [1])
+        self.assertEqual(
+            result[1]["content"][-1]["cache_control"], {"type": "ephemeral"}
+        )
+        self.assertNotIn("cache_control", conversation[1]["content"][-1])
+
+    def test_marks_message_before_newest_screenshot(self):
+        conversation = [
+            {"role": "system", "content": "System prompt"},
+            self._image_message("Task: test"),
+            {"role": "assistant", "content": "Action: Click(1, 2)"},
+            {"role": "user", "content": [{"type": "text", "text": "URL: page2"}]},
+            {"role": "assistant", "content": "Action: Type(abc)"},
+            self._image_message("URL: page3"),
+        ]
+
+        result = llm.add_cache_breakpoint(conversation, model="anthropic/claude")
+
+        self.assertEqual(self._breakpoints(result), [4])
+        self.assertEqual(
+            result[4]["content"],
+            [
+                {
+                    "type": "text",
+                    "text": "Action: Type(abc)",
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+        )
+        self.assertEqual(result[:4], conversation[:4])
+        self.assertIs(result[5], conversation[5])
+
+    def test_text_only_turn_marks_last_message(self):
+        conversation = [
+            {"role": "system", "content": "System prompt"},
+            self._image_message("Task: test"),
+            {"role": "assistant", "content": "Action: Oops()"},
+            {"role": "user", "content": "Error: Unknown action: Oops"},
+        ]
+
+        result = llm.add_cache_breakpoint(conversation, model="anthropic/claude")
+
+        self.assertEqual(self._breakpoints(result), [3])
+
+    def test_other_model_unchanged(self):
+        conversation = [
+            {"role": "system", "content": "System prompt"},
+            self._image_message("Task: test"),
+        ]
+
+        result = llm.add_cache_breakpoint(conversation, model="qwen/qwen3-vl")
+
+        self.assertIs(result, conversation)
+
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        patcher = patch.object(llm, "CACHE_DIR", self.cache_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(llm, "client")
+        self.mock_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        create = self.mock_client.chat.completions.create
+        create.return_value.choices[0].message.content = "Action: Wait()"
+
+    def _make_stream(self, deltas: list[str]) -> MagicMock:
+        stream = self.mock_client.chat.completions.create.return_value
+        stream.__enter__.return_value = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content=d))]) for d in deltas
+        ]
+        return stream
+
+    def test_cache_hit_skips_api(self):
+        conversation = [{"role": "user", "content": "hello"}]
+        with patch.dict(os.environ, {"TWNA_CACHE": "1"}):
+            first = llm.call_llm(conversation)
+            second = llm.call_llm(conversation)
+
+        self.assertEqual(first, "Action: Wait()")
+        self.assertEqual(second, "Action: Wait()")
+        self.mock_client.chat.completions.create.assert_called_once()
+
+    def test_cache_disabled_by_default(self):
+        conversation = [{"role": "user", "content": "hello"}]
+        with patch.dict(os.environ, {"TWNA_CACHE": ""}):
+            llm.call_llm(conversation)
+            llm.call_llm(conversation)
+
+        self.assertEqual(self.mock_client.chat.completions.create.call_count, 2)
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    def test_stream_caches_text_read_before_close(self):
+        stream = self._make_stream(["Action: Click(1, 2)", " ignored"])
+        conversation = [{"role": "user", "content": "hello"}]
+        with patch.dict(os.environ, {"TWNA_CACHE": "1"}):
+            first = collect_response(llm.call_llm_stream(conversation))
+            second = collect_response(llm.call_llm_stream(conversation))
+
+        self.assertEqual(first, "Action: Click(1, 2)")
+        self.assertEqual(second, "Action: Click(1, 2)")
+        self.mock_client.chat.completions.create.assert_called_once()
+        stream.__exit__.assert_called_once()
+
+    def test_stream_closed_before_action_not_cached(self):
+        self._make_stream(["<reasoning>Thinking", "</reasoning>", "Action: Wait()"])
+        conversation = [{"role": "user", "content": "hello"}]
+        with patch.dict(os.environ, {"TWNA_CACHE": "1"}):
+            chunks = llm.call_llm_stream(conversation)
+            next(chunks)
+            chunks.close()
+
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    def test_stream_cached_when_exhausted(self):
+        self._make_stream(["Action: ", "Finished"])
+        conversation = [{"role": "user", "content": "hello"}]
+        with patch.dict(os.environ, {"TWNA_CACHE": "1"}):
+            collect_response(llm.call_llm_stream(conversation))
+            cached = llm.call_llm(conversation)
+
+        self.assertEqual(cached, "Action: Finished")
+        self.mock_client.chat.completions.create.assert_called_once()
+
+
+class SaveRunTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+        patcher = patch.object(save_results, "datetime")
+        mock_datetime = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_datetime.now.return_value.strftime.return_value = "20260101_000000"
+
+    def _make_steps(self) -> list[Step]:
+        return [
+            Step(
+                state=BrowserState(screenshot=bytes([i]) * 10, url=f"https://a.b/{i}"),
+                response=f"<reasoning> Café {i} </reasoning>\nAction: Wait()",
+                action=Action(name="Wait"),
+            )
+            for i in range(3)
+        ]
+
+    def _save(self, subdir: str, steps: list[Step]) -> str:
+        return save_results.save_run(
+            "Task é", steps, output_dir=os.path.join(self.output_dir.name, subdir)
+        )
+
+    def test_writes_screenshots_and_summary(self):
+        steps = self._make_steps()
+
+        run_dir = self._save("run", steps)
+
+        screenshots_dir = os.path.join(run_dir, "screenshots")
+        self.assertEqual(
+            sorted(os.listdir(screenshots_dir)),
+            ["step_00.jpg", "step_01.jpg", "step_02.jpg"],
+        )
+        for i, step in enumerate(steps):
+            with open(os.path.join(screenshots_dir, f"step_{i:02d}.jpg"), "rb") as f:
+                self.assertEqual(f.read(), step.state.screenshot)
+
+        with open(os.path.join(run_dir, "summary.json"), encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["total_steps"], 3)
+        self.assertEqual(summary["steps"][1]["screenshot"], "screenshots/step_01.jpg")
+        self.assertEqual(summary["steps"][1]["reasoning"], "Café 1")
+
+    def test_empty_steps(self):
+        run_dir = self._save("run", [])
+
+        self.assertEqual(os.listdir(os.path.join(run_dir, "screenshots")), [])
+        with open(os.path.join(run_dir, "summary.json"), encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["total_steps"], 0)
+        self.assertEqual(summary["steps"], [])
+
+    def test_json_fallback_matches_orjson(self):
+        steps = self._make_steps()
+
+        orjson_dir = self._save("orjson", steps)
+        with patch.object(save_results, "orjson", None):
+            json_dir = self._save("json", steps)
+
+        with open(os.path.join(orjson_dir, "summary.json"), "rb") as f:
+            orjson_bytes = f.read()
+        with open(os.path.join(json_dir, "summary.json"), "rb") as f:
+            json_bytes = f.read()
+        self.assertEqual(orjson_bytes, json_bytes)
+        self.assertIn("Café".encode("utf-8"), json_bytes)
+
+
 if __name__ == "__main__":
     unittest.main()